@@ -6,40 +6,63 @@ import tfs
 
 from tfs_viewer.displays import display_file_dataframe, display_file_headers
 from tfs_viewer.figures import plotly_density_contour, plotly_histogram, plotly_line_chart
-from tfs_viewer.upload import handle_file_upload
+from tfs_viewer.upload import get_upload_hash, handle_file_upload
+from tfs_viewer.utils import dataframe_fingerprint, read_cached_tfs, to_arrow_dtypes, write_cached_tfs
 
 GITHUB_BADGE = "https://img.shields.io/badge/GitHub-100000?style=for-the-badge&logo=github&logoColor=white"
 GITHUB_URL = "https://github.com/fsoubelet/tfs_viewer_prototype"
+DATAFRAME_HEIGHTS = tuple(range(100, 850, 50))
+DISPLAY_COLORMAPS = ("None", "viridis", "plasma", "inferno", "magma", "cividis")
 
 # ----- Cached Functions ----- #
 
 
-@st.cache_data(persist=True)
-def load_tfs_file(tfs_file_path: str, index: str, file_obj: int) -> tuple[dict, pd.DataFrame]:
+@st.cache_resource(show_spinner=False, max_entries=16)
+def load_tfs_file(content_hash: str, index: str, _uploaded) -> tuple[dict, pd.DataFrame]:
     """
-    Loads the chosen TFS file, returns the headers and the dataframe itself. The results are cached for
-    efficiency on heavy files. The file will be a temporary file created from uploaded data, and the file
-    object is used so we can properly close it.
+    Loads the uploaded TFS file, returns the headers and the dataframe itself. The results are cached for
+    efficiency on heavy files, keyed on the hash of the uploaded content so that uploading the same file
+    again does not trigger a new parsing. The cached objects are shared rather than copied on each call,
+    and should not be modified in place. If enabled, parsed data is also kept in an on-disk Feather cache
+    which outlives the app process. On a miss, the data is written to a temporary file which is removed once
+    read. The content hash and index are stored in the dataframe's attrs, to identify it in other caches.
 
     Args:
-        tfs_file_path (str): absolute path to the file to load.
+        content_hash (str): hash of the uploaded file's content, used as cache key.
         index (str): which column to use as inndex during loading.
-        file_obj (int): OS-level handle to the opened file as returned by the tempfile.mkstemp function.
+        _uploaded: the uploaded file object given back by streamlit's file_uploader. Not hashed.
 
     Returns:
-        A tuple of the TfsDataFrame's headers (dictionary) and the dataframe itself as a pandas.DataFrame.
+        A tuple of the TfsDataFrame's headers (dictionary) and the dataframe itself as a pandas.DataFrame
+        with PyArrow-backed columns.
     """
+    cached = read_cached_tfs(content_hash, index)
+    if cached is not None:
+        headers, data_frame = cached
+        data_frame.attrs.update(content_hash=content_hash, index=index)
+        return headers, data_frame
+
+    tfs_file_path = None
     try:
+        tfs_file_path = handle_file_upload(_uploaded)
         tfs_df = tfs.read(tfs_file_path, index)
-        os.close(file_obj)  # remember to close (and delete) the tempfile
-        return tfs_df.headers, pd.DataFrame(tfs_df)
+        headers, data_frame = tfs_df.headers, to_arrow_dtypes(pd.DataFrame(tfs_df))
+        data_frame.attrs.update(content_hash=content_hash, index=index)
+        write_cached_tfs(content_hash, index, headers, data_frame)
+        return headers, data_frame
     except Exception as error:  # noqa: BLE001
         st.write(error)
+    finally:  # remember to delete the tempfile
+        if tfs_file_path is not None:
+            os.remove(tfs_file_path)
 
 
-@st.cache_data(persist=True)
+# Shared rather than copied on each rerun, as copying a heavy queried dataframe is costly
+@st.cache_resource(show_spinner=False, max_entries=16, hash_funcs={pd.DataFrame: dataframe_fingerprint})
 def apply_dataframe_query(data_frame: pd.DataFrame, query: str) -> pd.DataFrame:
-    return data_frame.query(query)
+    queried = data_frame.query(query)
+    queried.attrs["query"] = query  # the other attrs are carried over, this sets it apart from the full data
+    return queried
 
 
 # ----- Page Config ----- #
@@ -76,11 +99,11 @@ show_dataframe: bool = display_form.checkbox(
     "Show File DataFrame", value=True, help="Whether to display the `DataFrame` of the loaded file."
 )
 dataframe_height: int = display_form.select_slider(
-    "DataFrame Display Height", options=list(range(100, 850, 50)), value=400
+    "DataFrame Display Height", options=DATAFRAME_HEIGHTS, value=400
 )
 color_map: str = display_form.selectbox(
     "Display Color Map",
-    options=["None", "viridis", "plasma", "inferno", "magma", "cividis"],
+    options=DISPLAY_COLORMAPS,
     help="Which colormap to apply when styling the `DataFrame`.",
 )
 display_form.form_submit_button("Apply Options")
@@ -113,8 +136,13 @@ st.header("Let's Get Your File")
 uploaded_file = st.file_uploader("File to load", help="Select your TFS File.")
 
 if uploaded_file is not None:
-    file, file_path = handle_file_upload(uploaded_file)
-    st.session_state.headers, st.session_state.dataframe = load_tfs_file(file_path, chosen_index, file)
+    # Only hash and load the upload when it (or the index) changes, other reruns reuse the loaded data
+    upload_key = (uploaded_file.file_id, chosen_index)
+    if st.session_state.get("upload_key") != upload_key:
+        content_hash = get_upload_hash(uploaded_file)
+        headers, data_frame = load_tfs_file(content_hash, chosen_index, uploaded_file)
+        st.session_state.headers, st.session_state.dataframe = headers, data_frame
+        st.session_state.upload_key = upload_key
 
     # Sets desired index if it is changed in the sidebar for an already uploaded file
     if chosen_index != "" and chosen_index in st.session_state.dataframe.columns:
@@ -1,6 +1,13 @@
+import numpy as np
 import pandas as pd
 import streamlit as st
 
+# Below pandas' default "styler.render.max_elements" so the option never needs to be raised
+MAX_STYLED_CELLS = 200_000
+# Dataframes heavier than this (in bytes) are sent to the frontend in windows of DISPLAY_WINDOW_ROWS rows
+MAX_DISPLAYED_BYTES = 500 * 1024**2
+DISPLAY_WINDOW_ROWS = 200_000
+
 # ----- Display Components ----- #
 
 
@@ -11,13 +18,34 @@ def display_file_headers(headers_dict: dict) -> None:
 
 
 def display_file_dataframe(data_frame: pd.DataFrame, height: int, colormap: str) -> None:
-    """Simply display dataframe, as a Styler object if a colormap is given."""
+    """
+    Simply display dataframe, as a Styler object if a colormap is given. Styling is rendered cell by cell
+    in Python, so it is skipped for dataframes above MAX_STYLED_CELLS cells. Very heavy dataframes are
+    displayed by windows of rows, chosen by the user.
+    """
     st.header("File Data", anchor="dataframe")
-    # Make sure the styler option will allow for the dataframe size
-    n_cells = data_frame.shape[0] * data_frame.shape[1]
-    pd.set_option("styler.render.max_elements", n_cells)
+    n_rows = len(data_frame)
+    # Cheap estimate (does not inspect python objects), but Arrow-backed columns report their actual size
+    if n_rows > DISPLAY_WINDOW_ROWS and data_frame.memory_usage().sum() > MAX_DISPLAYED_BYTES:
+        offset: int = st.number_input(
+            "First Displayed Row",
+            min_value=0,
+            max_value=n_rows - 1,
+            value=0,
+            step=DISPLAY_WINDOW_ROWS,
+            help="The dataframe is too heavy to be displayed at once, only a window of it is shown.",
+        )
+        data_frame = data_frame.iloc[offset : offset + DISPLAY_WINDOW_ROWS]
+        st.caption(f"Showing rows {offset:,} to {offset + len(data_frame) - 1:,} out of {n_rows:,}.")
+    if colormap != "None" and data_frame.size > MAX_STYLED_CELLS:
+        st.info(
+            f"The colormap is not applied to dataframes with more than {MAX_STYLED_CELLS:,} cells, as "
+            "styling them is too slow. Apply a query to reduce the data if you need the styling."
+        )
+        colormap = "None"
+    numeric_columns = data_frame.select_dtypes("number").columns  # only these can get a gradient
     styler = (
-        data_frame.style.background_gradient(cmap=colormap).highlight_null(color="red")
+        data_frame.style.background_gradient(cmap=colormap, subset=numeric_columns).apply(_highlight_missing)
         if colormap != "None"
         else data_frame
     )
@@ -28,3 +56,14 @@ def display_file_dataframe(data_frame: pd.DataFrame, height: int, colormap: str)
         "slow down page refreshes when applying operations. If you loaded a heavy dataframe, consider "
         "un-ticking the `Show File DataFrame` box in the sidebar."
     )
+
+
+# ----- Helpers ----- #
+
+
+def _highlight_missing(column: pd.Series) -> np.ndarray:
+    """
+    Styles the missing values of a column in red. Arrow-backed numeric columns hold NaN as a float value
+    rather than a null, which isna() does not flag (unlike highlight_null), but NaN != NaN catches them.
+    """
+    return np.where(column.isna() | (column != column), "background-color: red", "")
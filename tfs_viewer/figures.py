@@ -1,23 +1,42 @@
-from itertools import zip_longest
+from __future__ import annotations
 
+from itertools import cycle, zip_longest
+
+import numpy as np
 import pandas as pd
-import plotly.express as px
 import plotly.graph_objects as go
 import streamlit as st
+from plotly.colors import qualitative
+from plotly.subplots import make_subplots
 
 from tfs_viewer.forms import get_density_plot_params, get_histplot_params, get_scatter_plot_params
+from tfs_viewer.utils import dataframe_fingerprint, lttb_indices
+
+# Traces with more points are downsampled, as sending them all to the browser makes the plot sluggish
+MAX_PLOTTED_POINTS = 5_000
+# Traces with fewer points are drawn as SVG, beyond that WebGL is much faster
+MAX_SVG_POINTS = 1_000
+# Traces left this large despite downsampling (non-numeric ones) get no hover, as building its lookup is costly.
+# Traces the user chose not to downsample keep it, as seeing every point is then the point of the plot
+MAX_HOVERED_POINTS = 50_000
+# Marginal distributions of the histogram plot are drawn from a random sample of at most this many points
+MAX_MARGINAL_POINTS = 10_000
+# Maximum number of bins along each axis for the density plot's grid
+MAX_DENSITY_PLOT_BINS = 128
+# Fixed figure margins, in pixels
+FIGURE_MARGINS = {"l": 40, "r": 10, "t": 30, "b": 30}
 
 # ----- Plotting Functions ----- #
 
 
 def plotly_line_chart(data_frame: pd.DataFrame) -> None:
     """
-    Query user-given options for the plot and craft a plotly Scattergl plot from the data_frame's data.
+    Query user-given options for the plot and craft a plotly scatter plot from the data_frame's data.
 
     Args:
         data_frame (pd.DataFrame): The user loaded TFS data frame.
     """
-    versus, plot_quantities, mode, height, errors_x, errors_y = get_scatter_plot_params(data_frame)
+    versus, plot_quantities, mode, height, errors_x, errors_y, downsample = get_scatter_plot_params(data_frame)
 
     if len(errors_x) not in [0, len(plot_quantities)] or len(errors_y) not in [
         0,
@@ -28,27 +47,14 @@ def plotly_line_chart(data_frame: pd.DataFrame) -> None:
             "Some properties will be plotted without error bars."
         )
 
-    fig = go.Figure(layout=go.Layout(height=height))
-    for variable, err_x, err_y in zip_longest(plot_quantities, errors_x, errors_y):
-        fig.add_trace(
-            go.Scattergl(
-                x=data_frame[versus].to_numpy(),
-                y=data_frame[variable].to_numpy(),
-                mode=mode,
-                name=variable,
-                error_x=(
-                    {"type": "data", "array": data_frame[err_x].to_numpy(), "visible": True}
-                    if err_x in data_frame.columns
-                    else None
-                ),
-                error_y=(
-                    {"type": "data", "array": data_frame[err_y].to_numpy(), "visible": True}
-                    if err_y in data_frame.columns
-                    else None
-                ),
-            )
-        )
-    st.plotly_chart(fig, use_container_width=True)
+    # Error bar properties pair with plotted ones by position, extra ones have nothing to attach to
+    errors_x, errors_y = errors_x[: len(plot_quantities)], errors_y[: len(plot_quantities)]
+    fig = _build_scatter_figure(
+        data_frame, versus, tuple(plot_quantities), mode, height, tuple(errors_x), tuple(errors_y), downsample
+    )
+    if downsample and len(data_frame) > MAX_PLOTTED_POINTS:
+        st.caption(f"Numeric traces are downsampled to {MAX_PLOTTED_POINTS:,} points for display.")
+    _display_figure(fig, _ui_revision(data_frame, versus, *plot_quantities))
 
 
 def plotly_histogram(data_frame: pd.DataFrame) -> None:
@@ -61,16 +67,10 @@ def plotly_histogram(data_frame: pd.DataFrame) -> None:
     plot_quantities, marginal_mode, histnorm, n_bins, height = get_histplot_params(data_frame)
     if plot_quantities:  # errors if not
         norm_method = None if histnorm == "None" else histnorm
-        fig = px.histogram(
-            data_frame,
-            x=plot_quantities,
-            marginal=marginal_mode,
-            histnorm=norm_method,
-            barmode="overlay",
-            height=height,
-            nbins=n_bins,
-        )
-        st.plotly_chart(fig, use_container_width=True)
+        fig = _build_histogram_figure(data_frame, tuple(plot_quantities), marginal_mode, norm_method, n_bins, height)
+        if len(data_frame) > MAX_MARGINAL_POINTS:
+            st.caption(f"Marginal distributions are drawn from a random sample of {MAX_MARGINAL_POINTS:,} points.")
+        _display_figure(fig, _ui_revision(data_frame, *plot_quantities))
 
 
 def plotly_density_contour(data_frame: pd.DataFrame) -> None:
@@ -81,11 +81,281 @@ def plotly_density_contour(data_frame: pd.DataFrame) -> None:
         data_frame (pd.DataFrame): The user loaded TFS data frame.
     """
     xcol, ycol, coloring, cmap, reverse_cmap, height = get_density_plot_params(data_frame)
-    fig = px.density_contour(data_frame, x=xcol, y=ycol, height=height)
+    fig = _build_density_figure(data_frame, xcol, ycol, coloring, cmap, reverse_cmap, height)
+    _display_figure(fig, _ui_revision(data_frame, xcol, ycol))
+
+
+# ----- Figure Builders ----- #
+# These are cached on the data and the form's outputs, so that reruns with unchanged plot options (resubmitting
+# a form, or interacting with any other widget) reuse the previous figure instead of building it again.
+
+
+@st.cache_data(show_spinner=False, max_entries=32, hash_funcs={pd.DataFrame: dataframe_fingerprint})
+def _build_scatter_figure(
+    data_frame: pd.DataFrame,
+    versus: str,
+    plot_quantities: tuple[str, ...],
+    mode: str,
+    height: int,
+    errors_x: tuple[str, ...],
+    errors_y: tuple[str, ...],
+    downsample: bool,
+) -> go.Figure:
+    """Builds the scatter plot figure, one trace per plotted quantity, see `plotly_line_chart`."""
+    # Extract each needed column once, so that traces sharing a column also share the same array
+    arrays = {
+        column: data_frame[column].to_numpy()
+        for column in {versus, *plot_quantities, *errors_x, *errors_y}
+        if column in data_frame.columns
+    }
+
+    traces = []
+    for variable, err_x, err_y in zip_longest(plot_quantities, errors_x, errors_y):
+        points = _plotted_points(arrays[versus], arrays[variable], downsample, drop_missing=mode == "markers")
+        x = arrays[versus][points]
+        trace = go.Scattergl if x.size > MAX_SVG_POINTS else go.Scatter  # SVG renders small traces faster
+        traces.append(
+            trace(
+                x=x,
+                y=_single_precision(arrays[variable][points]),
+                mode=mode,
+                name=variable,
+                error_x=_error_bars(arrays.get(err_x), points),
+                error_y=_error_bars(arrays.get(err_y), points),
+                hoverinfo="skip" if downsample and x.size > MAX_HOVERED_POINTS else None,
+            )
+        )
+    # Given all at once, the figure validates its data a single time instead of once per added trace
+    return go.Figure(data=traces, layout=go.Layout(height=height))
+
+
+@st.cache_data(show_spinner=False, max_entries=32, hash_funcs={pd.DataFrame: dataframe_fingerprint})
+def _build_histogram_figure(
+    data_frame: pd.DataFrame,
+    plot_quantities: tuple[str, ...],
+    marginal_mode: str,
+    norm_method: str | None,
+    n_bins: int,
+    height: int,
+) -> go.Figure:
+    """Builds the histogram figure, with the marginal distributions on top, see `plotly_histogram`."""
+    # Bins are computed here so only their counts, not every data point, are sent to the browser. Like plotly
+    # does for overlaid histograms, numeric columns share the same bins so their bars can be compared
+    columns = {variable: data_frame[variable].to_numpy() for variable in plot_quantities}
+    edges = _shared_bin_edges([values for values in columns.values() if values.dtype.kind in "biuf"], n_bins)
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.25, 0.75], vertical_spacing=0.02)
+    for (variable, values), color in zip(columns.items(), cycle(qualitative.Plotly)):
+        positions, counts, widths = _binned_counts(values, edges, norm_method)
+        fig.add_trace(
+            go.Bar(
+                x=positions,
+                y=counts,
+                width=widths,
+                name=variable,
+                legendgroup=variable,
+                marker_color=color,
+                opacity=0.5,
+            ),
+            row=2,
+            col=1,
+        )
+        if values.dtype.kind in "biuf":
+            if values.size > MAX_MARGINAL_POINTS:  # fixed seed so the sample is stable across reruns
+                values = np.random.default_rng(0).choice(values, size=MAX_MARGINAL_POINTS, replace=False)
+            marginal = _marginal_trace(marginal_mode, _single_precision(values), variable, color)
+            fig.add_trace(marginal, row=1, col=1)
+    fig.update_layout(barmode="overlay", bargap=0, height=height)
+    fig.update_yaxes(showticklabels=False, row=1, col=1)
+    fig.update_yaxes(title_text=norm_method or "count", row=2, col=1)
+    return fig
+
+
+@st.cache_data(show_spinner=False, max_entries=32, hash_funcs={pd.DataFrame: dataframe_fingerprint})
+def _build_density_figure(
+    data_frame: pd.DataFrame, xcol: str, ycol: str, coloring: str, cmap: str, reverse_cmap: str, height: int
+) -> go.Figure:
+    """Builds the density contour figure of *ycol* against *xcol*, see `plotly_density_contour`."""
+    x, y = data_frame[xcol].to_numpy(), data_frame[ycol].to_numpy()
+    if x.dtype.kind in "biuf" and y.dtype.kind in "biuf":
+        # Bin here so only the density grid, not every data point, is sent to the browser
+        finite = np.isfinite(x) & np.isfinite(y)
+        x, y = x[finite], y[finite]
+        density, xedges, yedges = np.histogram2d(x, y, bins=[_density_bin_edges(x), _density_bin_edges(y)])
+        fig = go.Figure(
+            go.Contour(
+                z=_single_precision(density.T),
+                x=(xedges[:-1] + xedges[1:]) / 2,
+                y=(yedges[:-1] + yedges[1:]) / 2,
+            ),
+            layout=go.Layout(height=height, xaxis_title=xcol, yaxis_title=ycol),
+        )
+    else:  # categorical data is left to plotly express, imported here as it is slow to load
+        import plotly.express as px
+
+        fig = px.density_contour(data_frame, x=xcol, y=ycol, height=height)
     fig.update_traces(
         contours_coloring=coloring,
         contours_showlabels=True,
         colorscale=None if cmap == "Default" else cmap,
         reversescale=bool(reverse_cmap == "Reversed"),
     )
+    return fig
+
+
+# ----- Helpers ----- #
+
+
+def _display_figure(fig: go.Figure, uirevision: str) -> None:
+    """
+    Displays the figure in the app. Its layout is fixed beforehand so plotly.js does not have to reflow it,
+    and the user's zoom and pan are kept across streamlit reruns as long as *uirevision* does not change.
+    """
+    fig.update_layout(autosize=True, margin=FIGURE_MARGINS, uirevision=uirevision)
     st.plotly_chart(fig, use_container_width=True)
+
+
+def _ui_revision(data_frame: pd.DataFrame, *columns: str) -> str:
+    """
+    Plotly uirevision for a figure of the given columns, which changes (and resets the view) when other
+    columns are plotted or another file is loaded.
+    """
+    return str((data_frame.attrs.get("content_hash"), columns))
+
+
+def _plotted_points(x: np.ndarray, y: np.ndarray, downsample: bool, drop_missing: bool) -> np.ndarray | slice:
+    """
+    Indices of the points to plot for a numeric trace: downsampled if requested and too many to render,
+    and without the points having a NaN coordinate if asked (these are not drawn as markers, but break
+    lines in gaps).
+    """
+    if x.dtype.kind not in "biuf" or y.dtype.kind not in "biuf":
+        return slice(None)
+    if downsample and x.size > MAX_PLOTTED_POINTS:
+        finite = np.isfinite(x) & np.isfinite(y)
+        kept = _downsampled_points(x, y, finite)
+        return kept if drop_missing else _with_gaps(kept, finite)
+    if not drop_missing:
+        return slice(None)
+    finite = np.isfinite(x) & np.isfinite(y)
+    return slice(None) if finite.all() else np.flatnonzero(finite)  # avoids copies when nothing is dropped
+
+
+def _downsampled_points(x: np.ndarray, y: np.ndarray, finite: np.ndarray) -> np.ndarray:
+    """
+    Sorted indices of at most MAX_PLOTTED_POINTS finite points of the trace. LTTB keeps the shape of series
+    (x sorted, e.g. along S), but for anything else it would mostly keep outliers and a random sample
+    (fixed seed so it is stable across reruns) gives a faithful picture of the data instead.
+    """
+    finite_x = x[finite]
+    if np.all(finite_x[1:] >= finite_x[:-1]):
+        return lttb_indices(x, y, MAX_PLOTTED_POINTS)
+    candidates = np.flatnonzero(finite)
+    if candidates.size <= MAX_PLOTTED_POINTS:
+        return candidates
+    return np.sort(np.random.default_rng(0).choice(candidates, size=MAX_PLOTTED_POINTS, replace=False))
+
+
+def _with_gaps(kept: np.ndarray, finite: np.ndarray) -> np.ndarray:
+    """
+    Adds to the kept points of a trace one of the non-finite points lying between consecutive kept ones,
+    if any, so that lines are still broken where the data has gaps.
+    """
+    missing = np.flatnonzero(~finite)
+    if not missing.size:
+        return kept
+    missing_before = np.searchsorted(missing, kept)  # first missing point after each kept one
+    gaps = np.flatnonzero(np.diff(missing_before))  # kept points followed by a missing one before the next
+    return np.sort(np.concatenate([kept, missing[missing_before[gaps]]]))
+
+
+def _single_precision(values: np.ndarray) -> np.ndarray:
+    """
+    Casts double precision values to single precision, halving the data serialized to the browser. This is
+    the precision WebGL works with anyway, and plenty for display. Other dtypes are returned as is.
+    """
+    return values.astype(np.float32) if values.dtype == np.float64 else values
+
+
+def _error_bars(errors: np.ndarray | None, points: np.ndarray | slice) -> dict | None:
+    """Error bars specification for a trace from the error values, restricted to the plotted points."""
+    if errors is None:
+        return None
+    return {"type": "data", "array": _single_precision(errors[points]), "visible": True}
+
+
+def _density_bin_edges(values: np.ndarray) -> np.ndarray:
+    """
+    Bin edges along one axis of the density plot's grid. Their number grows with the amount of data so that
+    small datasets still give a smooth density, up to a cap. It follows numpy's "auto" estimator (the most
+    bins of the Freedman-Diaconis and Sturges estimates), but is computed and capped before building edges:
+    outliers can make the estimate huge, and older numpy versions would then try to allocate all of them.
+    """
+    values = values.astype(np.float64, copy=False)
+    n_bins = np.log2(values.size) + 1 if values.size else 1  # Sturges
+    if values.size > 1:
+        q25, q75 = np.percentile(values, [25, 75])
+        width = 2 * (q75 - q25) / np.cbrt(values.size)  # Freedman-Diaconis
+        if width > 0:
+            n_bins = max(n_bins, np.ptp(values) / width)
+    return np.histogram_bin_edges(values, bins=int(min(np.ceil(n_bins), MAX_DENSITY_PLOT_BINS)))
+
+
+def _shared_bin_edges(arrays: list[np.ndarray], n_bins: int) -> np.ndarray:
+    """Edges of *n_bins* equal bins spanning the finite values of all given numeric arrays."""
+    finite = [values[np.isfinite(values)] for values in arrays]
+    finite = [values for values in finite if values.size]
+    if not finite:
+        return np.histogram_bin_edges([], bins=n_bins)
+    bounds = np.array([min(values.min() for values in finite), max(values.max() for values in finite)])
+    return np.histogram_bin_edges(bounds.astype(np.float64), bins=n_bins)
+
+
+def _binned_counts(
+    values: np.ndarray, edges: np.ndarray, histnorm: str | None
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Computes the histogram of the given values, normalized the same way plotly would do it client-side.
+    Numeric values are split in the given bins (non-finite values are ignored), while other values are
+    counted per category.
+
+    Args:
+        values (np.ndarray): the data to bin.
+        edges (np.ndarray): edges of the bins for numeric data.
+        histnorm (str | None): plotly's histogram normalization routine, None for simple counts.
+
+    Returns:
+        A tuple of the bar positions, their heights and their widths.
+    """
+    if values.dtype.kind in "biuf":
+        values = values[np.isfinite(values)]
+        counts, edges = np.histogram(values, bins=edges)
+        positions, widths = (edges[:-1] + edges[1:]) / 2, np.diff(edges)
+    else:
+        categories = pd.Series(values).value_counts(sort=False)
+        positions, counts = categories.index.to_numpy(), categories.to_numpy()
+        widths = np.ones(counts.size)
+
+    counts = counts.astype(np.float64)
+    total = counts.sum() or 1.0  # avoid dividing by zero on empty data
+    if histnorm == "percent":
+        counts *= 100 / total
+    elif histnorm == "probability":
+        counts /= total
+    elif histnorm == "density":
+        counts /= widths
+    elif histnorm == "probability density":
+        counts /= total * widths
+    return positions, counts, widths
+
+
+def _marginal_trace(
+    marginal_mode: str, values: np.ndarray, name: str, color: str
+) -> go.Box | go.Violin | go.Scattergl:
+    """Distribution trace for the marginal axis of the histogram plot, as 'box', 'violin' or 'rug'."""
+    common = {"x": values, "name": name, "legendgroup": name, "showlegend": False, "marker_color": color}
+    if marginal_mode == "violin":
+        return go.Violin(**common)
+    if marginal_mode == "rug":  # ticks on the variable's own row, drawn with WebGL as there can be many
+        ticks = np.full(values.size, name, dtype=object)
+        return go.Scattergl(**common, y=ticks, mode="markers", marker_symbol="line-ns-open")
+    return go.Box(**common, notched=True)
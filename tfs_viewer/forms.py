@@ -2,18 +2,27 @@ from __future__ import annotations
 
 from typing import TYPE_CHECKING
 
-import plotly.express as px
 import streamlit as st
+from plotly.colors import named_colorscales
 
 if TYPE_CHECKING:
     from collections.abc import Sequence
 
     import pandas as pd
 
+# Built once at import rather than at each rerun of the forms
+FIGURE_HEIGHTS = tuple(range(200, 1500, 50))
+SCATTER_MODES = ("lines", "markers", "lines+markers")
+MARGINAL_MODES = ("box", "violin", "rug")
+HISTOGRAM_NORMALIZATIONS = ("None", "percent", "probability", "density", "probability density")
+CONTOUR_COLORINGS = ("fill", "heatmap", "lines", "none")
+COLORSCALES = ("Default", *(cmap.capitalize() for cmap in named_colorscales()))
+COLORSCALE_DIRECTIONS = ("Classic", "Reversed")
+
 
 def get_scatter_plot_params(
     data_frame: pd.DataFrame,
-) -> tuple[str, Sequence[str], str, int, Sequence[str], Sequence[str]]:
+) -> tuple[str, Sequence[str], str, int, Sequence[str], Sequence[str], bool]:
     """
     Form to query the user for scatter plots options with minimal reloading.
 
@@ -22,33 +31,35 @@ def get_scatter_plot_params(
 
     Returns:
         A tuple with the following user defined properties: X-axis column, Y-axis column(s), styling mode for
-        the chart, figure height, property(ies) for horizontal error bars and property(ies) for vertical
-        error bars.
+        the chart, figure height, property(ies) for horizontal error bars, property(ies) for vertical
+        error bars and whether to downsample large traces.
     """
+    column_names = tuple(data_frame.columns)  # extracted once for all widgets
+    error_options = ("", *column_names)
     scatter_options_form = st.form("Scatter Plot Options")
     scatter_options_form.header("Customize Your Scatter Plot")
     versus, columns, err_x, err_y, height, mode = scatter_options_form.columns(spec=[2, 3, 3, 3, 2, 2])
     with versus:
         versus: str = st.selectbox(
             "Property to Plot Against",
-            options=data_frame.columns.to_numpy(),
+            options=column_names,
             help="Select the column that will be on the horizontal axis",
         )
     with columns:
         to_plot: Sequence[str] = st.multiselect(
             "Columns to Plot",
-            options=data_frame.columns.to_numpy(),
+            options=column_names,
             help="Select the columns to plot in this chart",
             key="columns_for_scatterplot",
         )
     with height:
         line_chart_height: int = st.select_slider(
-            "ScatterPlot Figure Height", options=list(range(200, 1500, 50)), value=700
+            "ScatterPlot Figure Height", options=FIGURE_HEIGHTS, value=700
         )
     with err_x:
         horizontal_errors: Sequence[str] = st.multiselect(
             "Hozirontal Error Bars",
-            options=["", *data_frame.columns.tolist()],
+            options=error_options,
             help="Property to use for horizontal error bars. The first property provided here will be "
             "used for errors of the first property provided there and so on. Be aware that a mismatch "
             "in the number of inputs to plot and to use as error bars means some properties will be "
@@ -57,7 +68,7 @@ def get_scatter_plot_params(
     with err_y:
         vertical_errors: Sequence[str] = st.multiselect(
             "Vertical Error Bars",
-            options=["", *data_frame.columns.tolist()],
+            options=error_options,
             help="Property to use for vertical error bars. The first property provided here will be "
             "used for errors of the first property provided there and so on. Be aware that a mismatch "
             "in the number of inputs to plot and to use as error bars means some properties will be "
@@ -66,11 +77,18 @@ def get_scatter_plot_params(
     with mode:
         mode: str = st.selectbox(
             "Styling of the line chart",
-            options=["lines", "markers", "lines+markers"],
+            options=SCATTER_MODES,
             help="The styling of the scatter plot data",
         )
+        downsample: bool = st.checkbox(
+            "Downsample Large Traces",
+            value=True,
+            help="Whether to reduce the number of points of large numeric traces, keeping their visual "
+            "shape. This makes for a much more responsive plot. Large traces that cannot be downsampled "
+            "(non-numeric) are then shown without hover information.",
+        )
     scatter_options_form.form_submit_button("Submit and Update Plot")
-    return versus, to_plot, mode, line_chart_height, horizontal_errors, vertical_errors
+    return versus, to_plot, mode, line_chart_height, horizontal_errors, vertical_errors, downsample
 
 
 def get_histplot_params(data_frame: pd.DataFrame) -> tuple[Sequence[str], str, str, int, int]:
@@ -91,25 +109,25 @@ def get_histplot_params(data_frame: pd.DataFrame) -> tuple[Sequence[str], str, s
     with columns:
         to_plot: Sequence[str] = st.multiselect(
             "Columns to Plot",
-            options=data_frame.columns.to_numpy(),
+            options=tuple(data_frame.columns),
             help="Select the columns to plot in this chart",
             key="columns_for_histogram",
         )
     with marginal_mode:
         mode: str = st.selectbox(
             "Styling of distribution plot",
-            options=["box", "violin", "rug"],
+            options=MARGINAL_MODES,
             help="The type of distribution representation used for the upper axis",
         )
     with normalization_mode:
         histnorm: str = st.selectbox(
             "Normalization Routine",
-            options=["None", "percent", "probability", "density", "probability density"],
+            options=HISTOGRAM_NORMALIZATIONS,
             help="Bin normalization method. If None is selected, then the simple value counts are used",
         )
     with height:
         histogram_plot_height: int = st.select_slider(
-            "Histogram Figure Height", options=list(range(200, 1500, 50)), value=700
+            "Histogram Figure Height", options=FIGURE_HEIGHTS, value=700
         )
     with n_bins:
         nbins: int | float = st.number_input(  # careful streamlit might infer float from int inputs
@@ -135,41 +153,42 @@ def get_density_plot_params(data_frame: pd.DataFrame) -> tuple[str, str, str, st
         A tuple with the following user defined properties: X-axis column, Y-axis column, coutour type,
         color map to use, whether to reverse the colormap and figure height.
     """
+    column_names = tuple(data_frame.columns)  # extracted once for all widgets
     density_plot_options_form = st.form("Density Plot Options")
     density_plot_options_form.header("Customize Your Density Plot")
     xaxis, yaxis, contours, cmap, height, cmap_reverse = density_plot_options_form.columns(spec=[3, 3, 3, 3, 3, 2])
     with xaxis:
         xaxis_var: str = st.selectbox(
             "Property on the Horizontal Axis",
-            options=data_frame.columns.to_numpy(),
+            options=column_names,
             help="Select the column that will be on the horizontal axis",
         )
     with yaxis:
         yaxis_var: str = st.selectbox(
             "Property on the Vertical Axis",
-            options=data_frame.columns.to_numpy(),
+            options=column_names,
             help="Select the column that will be on the vertical axis",
         )
     with contours:
         coloring: str = st.selectbox(
             "Contour Types",
-            options=["fill", "heatmap", "lines", "none"],
+            options=CONTOUR_COLORINGS,
             help="Whether to fill the contours by extrapolating data",
         )
     with cmap:
         colorscale: str = st.selectbox(
             "Color Map",
-            options=["Default"] + [cmap.capitalize() for cmap in px.colors.named_colorscales()],
+            options=COLORSCALES,
             help="Which sequencial colormap to use for this plot",
         )
     with height:
         density_plot_height: int = st.select_slider(
-            "Histogram Figure Height", options=list(range(200, 1500, 50)), value=700
+            "Histogram Figure Height", options=FIGURE_HEIGHTS, value=700
         )
     with cmap_reverse:
         reverse_cmap: str = st.selectbox(
             "Colormap Scale",
-            options=["Classic", "Reversed"],
+            options=COLORSCALE_DIRECTIONS,
             help="Whether to reverse the colormap for the plot",
         )
     density_plot_options_form.form_submit_button("Submit and Update Plot")
@@ -1,21 +1,63 @@
-from io import StringIO
+from __future__ import annotations
+
+import hashlib
+import os
 from tempfile import mkstemp
 
+# RAM-backed on Linux, so that the temporary file does not have to go through the disk
+TEMPORARY_DIRECTORY = "/dev/shm" if os.access("/dev/shm", os.W_OK) else None
+
 
-def handle_file_upload(uploaded) -> tuple:
+def handle_file_upload(uploaded) -> str:
     """
     Handles a file uploaded with streamlit's file_uploader and writes the contents to a temporary file.
     That temporary file will then be read with tfs-pandas and destroyed. This implementation is convoluted
-    but as of now tfs-pandas does not handle buffer objects as returned by streamlit.
+    but as of now tfs-pandas does not handle buffer objects as returned by streamlit. When it has room for
+    the file, which is not a given (e.g. Docker only gives it 64MB by default), the file is created in
+    shared memory, otherwise in the default temporary directory.
 
     Args:
         uploaded: the uploaded file object given back by streamlit's file_uploader.
 
     Returns:
-        The file object and absolute path of the temporary file where the data was written.
+        The absolute path of the temporary file where the data was written.
+    """
+    data = uploaded.getbuffer()  # raw bytes written from a view of the buffer, tfs-pandas decodes them
+    if TEMPORARY_DIRECTORY is not None and _available_space(TEMPORARY_DIRECTORY) > data.nbytes:
+        try:
+            return _write_temporary_file(data, TEMPORARY_DIRECTORY)
+        except OSError:  # filled up by someone else in the meantime
+            pass
+    return _write_temporary_file(data, None)
+
+
+def get_upload_hash(uploaded) -> str:
     """
-    string_data = StringIO(uploaded.getvalue().decode("utf-8")).read()
-    fd, path = mkstemp(suffix=".tfs")
-    with open(path, "w") as f:
-        f.write(string_data)
-    return fd, path
+    Computes a hash of the contents of a file uploaded with streamlit's file_uploader, to be used as a
+    cache key independent of the temporary file the data ends up written to.
+
+    Args:
+        uploaded: the uploaded file object given back by streamlit's file_uploader.
+
+    Returns:
+        The hexadecimal digest of the uploaded data.
+    """
+    return hashlib.blake2b(uploaded.getbuffer(), digest_size=16).hexdigest()
+
+
+def _available_space(directory: str) -> int:
+    """Number of bytes available to unprivileged users in the filesystem holding *directory*."""
+    stats = os.statvfs(directory)
+    return stats.f_bavail * stats.f_frsize
+
+
+def _write_temporary_file(data: memoryview, directory: str | None) -> str:
+    """Writes *data* to a new temporary file in *directory*, which is removed if the write fails."""
+    fd, path = mkstemp(suffix=".tfs", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:  # write through the descriptor mkstemp already opened, closing it after
+            f.write(data)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
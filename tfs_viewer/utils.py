@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from tempfile import mkstemp
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
+
+# The on-disk cache is opt-in: it keeps uploaded data on the server, so it is only used when given a directory
+CACHE_DIRECTORY = Path(os.environ["TFS_VIEWER_CACHE_DIR"]).expanduser() if os.getenv("TFS_VIEWER_CACHE_DIR") else None
+# Least recently used entries are removed once the cache grows beyond this size, set in MB
+MAX_CACHE_BYTES = int(os.environ.get("TFS_VIEWER_CACHE_MAX_MB", "1024")) * 1024**2
+# Bumped whenever the stored data changes, so entries written by previous versions of the app are not used
+CACHE_FORMAT_VERSION = 2
+
+# ----- Data Helpers ----- #
+
+
+def to_arrow_dtypes(data_frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converts the numeric, boolean and string columns of the dataframe to PyArrow-backed dtypes, which
+    are lighter in memory and are handed to streamlit's frontend without re-encoding. Column types are
+    otherwise kept as they are (floats stay floats etc), and complex columns are left untouched as they
+    have no Arrow equivalent. Numeric values are converted as is, so NaNs stay NaNs rather than becoming
+    Arrow nulls, and queries such as "X != X" keep finding them.
+
+    Args:
+        data_frame (pd.DataFrame): the dataframe to convert.
+
+    Returns:
+        A new dataframe with Arrow-backed columns.
+    """
+    data_frame = data_frame.copy(deep=False)
+    for column, dtype in data_frame.dtypes.items():
+        if isinstance(dtype, pd.ArrowDtype):  # already converted
+            continue
+        if dtype.kind in "biuf":
+            values = pa.array(data_frame[column].to_numpy(), from_pandas=False)
+            data_frame[column] = pd.arrays.ArrowExtensionArray(values)
+        elif pd.api.types.is_string_dtype(dtype):
+            data_frame[column] = data_frame[column].astype(pd.ArrowDtype(pa.string()))
+    return data_frame
+
+
+def dataframe_fingerprint(data_frame: pd.DataFrame) -> tuple:
+    """
+    Cheap identifier of a dataframe, to be given to st.cache_data's hash_funcs instead of having streamlit
+    hash all of the data at each rerun. Loaded dataframes carry the hash of the file content and the load
+    index in their attrs, and queried ones the query too, which together with the shape, columns and dtypes
+    identify the data. Other dataframes fall back to hashing their content.
+
+    Args:
+        data_frame (pd.DataFrame): the dataframe to identify.
+
+    Returns:
+        A tuple of hashable values identifying the dataframe.
+    """
+    attrs = data_frame.attrs
+    content = attrs["content_hash"] if "content_hash" in attrs else int(pd.util.hash_pandas_object(data_frame).sum())
+    return (
+        content,
+        attrs.get("index"),
+        attrs.get("query"),
+        data_frame.shape,
+        tuple(data_frame.columns),
+        tuple(map(str, data_frame.dtypes)),
+    )
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Selects the points to keep when downsampling a series to *n_out* points with the Largest-Triangle-
+    Three-Buckets algorithm, which preserves the visual shape of the data. The inner points are split in
+    buckets, and from each bucket is kept the point forming the largest triangle with the previously kept
+    point and the average of the next bucket. Buckets follow the order of the points, so this is only
+    meaningful for series sorted along x. Non-finite points are never selected.
+
+    Args:
+        x (np.ndarray): the horizontal coordinates of the series.
+        y (np.ndarray): the vertical coordinates of the series.
+        n_out (int): the number of points to keep.
+
+    Returns:
+        The sorted indices of the kept points, to be used on both arrays (and any matching error arrays).
+    """
+    finite = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+    n_points = finite.size
+    if n_points <= n_out or n_out < 3:
+        return finite
+    x, y = x[finite].astype(np.float64), y[finite].astype(np.float64)
+
+    edges = np.linspace(1, n_points - 1, n_out - 1).astype(np.int64)  # n_out - 2 buckets of inner points
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n_points - 1
+    for bucket in range(n_out - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        next_stop = edges[bucket + 2] if bucket + 2 < edges.size else n_points
+        next_x, next_y = x[stop:next_stop].mean(), y[stop:next_stop].mean()
+        previous = kept[bucket]
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:stop] - y[previous])
+            - (x[previous] - x[start:stop]) * (next_y - y[previous])
+        )
+        kept[bucket + 1] = start + np.argmax(areas)
+    return finite[kept]
+
+
+# ----- On-Disk Cache ----- #
+
+
+def _cache_path(content_hash: str, index: str) -> Path:
+    """Feather file location for the given file content and load index. Headers go in a sibling json."""
+    index_hash = hashlib.blake2b(index.encode("utf-8"), digest_size=8).hexdigest()
+    return CACHE_DIRECTORY / f"{content_hash}_{index_hash}.v{CACHE_FORMAT_VERSION}.feather"
+
+
+def read_cached_tfs(content_hash: str, index: str) -> tuple[dict, pd.DataFrame] | None:
+    """
+    Loads previously parsed TFS data from the on-disk cache, which survives restarts of the app and
+    evictions from streamlit's own cache. Reading the Feather file is much faster than parsing the TFS
+    text again. Columns are given the same dtypes as when parsing the file. Does nothing if the cache is
+    not enabled (see CACHE_DIRECTORY).
+
+    Args:
+        content_hash (str): hash of the TFS file's content.
+        index (str): which column was used as index when loading the file.
+
+    Returns:
+        A tuple of the headers (dictionary) and the dataframe, or None if nothing (readable) was cached.
+    """
+    if CACHE_DIRECTORY is None:
+        return None
+    cache_path = _cache_path(content_hash, index)
+    headers_path = cache_path.with_suffix(".json")
+    if not (cache_path.exists() and headers_path.exists()):
+        return None
+    try:
+        headers = json.loads(headers_path.read_text())
+        data_frame = feather.read_table(cache_path).to_pandas()  # compressed, so read into memory anyway
+        os.utime(cache_path)  # marks the entry as recently used, so it is pruned last
+    except (OSError, ValueError, pa.ArrowException):  # damaged entry, the file is parsed again instead
+        return None
+    return headers, to_arrow_dtypes(data_frame)
+
+
+def write_cached_tfs(content_hash: str, index: str, headers: dict, data_frame: pd.DataFrame) -> None:
+    """
+    Stores parsed TFS data in the on-disk cache, as a compressed Feather file for the dataframe and a
+    json file for the headers. Data that cannot be represented in these formats (for instance complex
+    columns or headers) is simply not cached. Files are written aside and then moved in place, so that
+    concurrent readers never see a partially written entry. The least recently used entries are then
+    removed if the cache exceeds MAX_CACHE_BYTES. Does nothing if the cache is not enabled.
+
+    Args:
+        content_hash (str): hash of the TFS file's content.
+        index (str): which column was used as index when loading the file.
+        headers (dict): the headers of the loaded file.
+        data_frame (pd.DataFrame): the loaded data.
+    """
+    if CACHE_DIRECTORY is None:
+        return
+    cache_path = _cache_path(content_hash, index)
+    headers_path = cache_path.with_suffix(".json")
+    try:
+        headers_json = json.dumps(headers, default=_json_builtin)  # before writing any data, in case it fails
+        CACHE_DIRECTORY.mkdir(parents=True, exist_ok=True)
+        _write_atomically(cache_path, lambda path: feather.write_feather(data_frame, path, compression="lz4"))
+        _write_atomically(headers_path, lambda path: Path(path).write_text(headers_json))
+    except (OSError, TypeError, ValueError, pa.ArrowException):
+        cache_path.unlink(missing_ok=True)
+        headers_path.unlink(missing_ok=True)
+    _prune_cache()
+
+
+def _prune_cache() -> None:
+    """Removes the least recently used entries of the on-disk cache until it fits in MAX_CACHE_BYTES."""
+    try:  # entries can be removed concurrently by other sessions, which is fine
+        entries = [(path.stat(), path) for path in CACHE_DIRECTORY.glob("*.feather")]
+        entries.sort(key=lambda entry: entry[0].st_mtime, reverse=True)  # most recently used first
+        total_size = 0
+        for stats, path in entries:
+            total_size += stats.st_size
+            if total_size > MAX_CACHE_BYTES:
+                path.unlink(missing_ok=True)
+                path.with_suffix(".json").unlink(missing_ok=True)
+    except OSError:
+        pass
+
+
+def _write_atomically(path: Path, write: Callable[[str], None]) -> None:
+    """Calls *write* on a temporary file next to *path*, then moves that file to *path*."""
+    fd, temporary_path = mkstemp(suffix=".tmp", dir=path.parent)
+    os.close(fd)
+    try:
+        write(temporary_path)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+
+
+def _json_builtin(value):
+    """Converts NumPy scalars, which tfs-pandas parses header values to, into builtins for json."""
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")